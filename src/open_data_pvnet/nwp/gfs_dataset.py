@@ -5,8 +5,13 @@
 3. Uncomment the main block below to run as a standalone script.
 """
 
+import functools
+import hashlib
+import importlib.metadata
 import logging
+import os
 import pandas as pd
+import torch
 import xarray as xr
 from torch.utils.data import Dataset
 from ocf_data_sampler.config import load_yaml_configuration
@@ -14,6 +19,7 @@ from ocf_data_sampler.torch_datasets.utils.valid_time_periods import find_valid_
 from ocf_data_sampler.constants import NWP_MEANS, NWP_STDS
 import fsspec
 import numpy as np
+import zarr
 
 
 # Configure logging
@@ -22,11 +28,53 @@ logging.basicConfig(level=logging.WARNING)
 # Ensure xarray retains attributes during operations
 xr.set_options(keep_attrs=True)
 
+# Filesystem options for the public S3 bucket holding the GFS store. Zarr already requests all
+# chunks of a selection concurrently, so widen the connection pool beyond botocore's default of
+# 10 to let those requests actually run in parallel, and skip the read-ahead block cache since
+# every chunk is fetched whole.
+GFS_STORAGE_OPTIONS = {
+    "anon": True,
+    "default_cache_type": "none",
+    "config_kwargs": {"max_pool_connections": 64},
+}
+
+# Suggested location for the opt-in on-disk cache of valid initialization times
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "open_data_pvnet")
+
+
+@functools.lru_cache(maxsize=None)
+def _open_gfs_store(dataset_path: str) -> xr.Dataset:
+    """
+    Open the consolidated GFS Zarr store, caching the result per dataset path.
+
+    The cache lives at module scope so repeated calls (and DataLoader workers forked from a
+    process that already opened the store) reuse the parsed metadata instead of re-reading it
+    from S3.
+
+    Args:
+        dataset_path (str): Path to the GFS dataset.
+
+    Returns:
+        xr.Dataset: The lazily loaded GFS dataset.
+    """
+    store = fsspec.get_mapper(dataset_path, **GFS_STORAGE_OPTIONS)
+    # chunks={} keeps the Dask chunks equal to the Zarr storage chunks, skipping the
+    # auto-rechunking probe that chunks="auto" performs
+    return xr.open_dataset(store, engine="zarr", consolidated=True, chunks={})
+
 
 def open_gfs(dataset_path: str) -> xr.DataArray:
     """
     Opens the GFS dataset stored in Zarr format and prepares it for processing.
 
+    The coordinate arrays (``init_time_utc``/``init_time`` and ``step``) should each be stored
+    as a single chunk, otherwise opening the store issues one request per coordinate chunk.
+    Use ``rechunk_coords`` once on a newly written store to enforce this.
+
+    Stores written as a single variable that already has a ``channel`` dimension, ideally in
+    (init_time_utc, step, channel, latitude, longitude) order, are used as-is; otherwise the
+    per-variable arrays are stacked into the channel dimension.
+
     Args:
         dataset_path (str): Path to the GFS dataset.
 
@@ -34,23 +82,70 @@ def open_gfs(dataset_path: str) -> xr.DataArray:
         xr.DataArray: The processed GFS data.
     """
     logging.info("Opening GFS dataset synchronously...")
-    store = fsspec.get_mapper(dataset_path, anon=True)
-    gfs_dataset: xr.Dataset = xr.open_dataset(
-        store, engine="zarr", consolidated=True, chunks="auto"
-    )
-    gfs_data: xr.DataArray = gfs_dataset.to_array(dim="channel")
+    gfs_dataset: xr.Dataset = _open_gfs_store(dataset_path)
+    data_vars = list(gfs_dataset.data_vars)
+    if len(data_vars) == 1 and "channel" in gfs_dataset[data_vars[0]].dims:
+        logging.debug("Using pre-stacked GFS variable...")
+        gfs_data: xr.DataArray = gfs_dataset[data_vars[0]]
+    else:
+        gfs_data: xr.DataArray = gfs_dataset.to_array(dim="channel")
 
     if "init_time" in gfs_data.dims:
         logging.debug("Renaming 'init_time' to 'init_time_utc'...")
         gfs_data = gfs_data.rename({"init_time": "init_time_utc"})
 
-    required_dims = ["init_time_utc", "step", "channel", "latitude", "longitude"]
-    gfs_data = gfs_data.transpose(*required_dims)
+    required_dims = ("init_time_utc", "step", "channel", "latitude", "longitude")
+    if gfs_data.dims != required_dims:
+        gfs_data = gfs_data.transpose(*required_dims)
 
     logging.debug(f"GFS dataset dimensions: {gfs_data.dims}")
     return gfs_data
 
 
+def rechunk_coords(
+    dataset_path: str,
+    coords: tuple = ("init_time_utc", "init_time", "step"),
+    storage_options: dict = None,
+) -> None:
+    """
+    Rewrite the given coordinate arrays of a Zarr store as single chunks.
+
+    Intended to be run once after the store is generated. Values, attributes and codecs are
+    kept; only the chunking changes. Metadata is re-consolidated afterwards.
+
+    Args:
+        dataset_path (str): Path to the Zarr store.
+        coords (tuple): Names of the coordinate arrays to rechunk. Missing names are skipped.
+        storage_options (dict, optional): Options passed to the fsspec filesystem.
+    """
+    store = fsspec.get_mapper(dataset_path, **(storage_options or {}))
+    group = zarr.open_group(store, mode="r+")
+
+    for name in coords:
+        if name not in group:
+            continue
+        array = group[name]
+        if array.size == 0 or array.chunks == array.shape:
+            logging.debug(f"Coordinate '{name}' is already a single chunk.")
+            continue
+
+        logging.info(f"Rechunking coordinate '{name}' from {array.chunks} to {array.shape}.")
+        attrs = array.attrs.asdict()
+        group.create_dataset(
+            name,
+            data=array[:],
+            chunks=array.shape,
+            dtype=array.dtype,
+            compressor=array.compressor,
+            filters=array.filters,
+            fill_value=array.fill_value,
+            overwrite=True,
+        )
+        group[name].attrs.update(attrs)
+
+    zarr.consolidate_metadata(store)
+
+
 def handle_nan_values(
     dataset: xr.DataArray, method: str = "fill", fill_value: float = 0.0
 ) -> xr.DataArray:
@@ -86,6 +181,10 @@ class GFSDataSampler(Dataset):
         config_filename: str,
         start_time: str = None,
         end_time: str = None,
+        sample_dtype: np.dtype = np.float32,
+        cache_dir: str = None,
+        return_tensors: bool = False,
+        nan_fill_value: float = None,
     ):
         """
         Initialize the GFSDataSampler.
@@ -95,27 +194,128 @@ class GFSDataSampler(Dataset):
             config_filename (str): Path to the configuration file.
             start_time (str, optional): Start time for filtering data.
             end_time (str, optional): End time for filtering data.
+            sample_dtype (np.dtype, optional): Dtype of the normalized samples. Use np.float16
+                to halve the bytes passed between DataLoader workers and written to disk.
+            cache_dir (str, optional): Directory for caching the valid initialization times,
+                e.g. ``DEFAULT_CACHE_DIR``. Caching is disabled when None (the default).
+            return_tensors (bool, optional): Return samples as contiguous torch tensors with
+                dims (step, channel, latitude, longitude) instead of xarray objects. This keeps
+                coordinates out of the payload pickled from DataLoader workers; the channel
+                order is available as ``self.channels``.
+            nan_fill_value (float, optional): If set, NaNs in each sample are replaced with this
+                value before normalization. Matches ``handle_nan_values(dataset, "fill")``
+                (infinities are left as-is) but only touches the sliced sample instead of adding
+                a pass over the full dataset.
         """
         logging.info("Initializing GFSDataSampler...")
         self.dataset = dataset
+        self.sample_dtype = np.dtype(sample_dtype)
+        self.return_tensors = return_tensors
+        self.nan_fill_value = nan_fill_value
         self.config = load_yaml_configuration(config_filename)
-        self.valid_t0_times = find_valid_time_periods({"nwp": {"gfs": self.dataset}}, self.config)
+        self.channels = self._select_channels()
+        self.dataset = self.dataset.sel(channel=self.channels)
+
+        # Normalization constants aligned to the channel axis; the reciprocal of the stds is
+        # stored so each sample only needs a subtract and a multiply
+        provider = self.config.input_data.nwp.gfs.provider
+        means = NWP_MEANS[provider].sel(channel=self.channels).values
+        stds = NWP_STDS[provider].sel(channel=self.channels).values
+        logging.debug(f"Mean Values: {means}")
+        logging.debug(f"Std Values: {stds}")
+        self._means = means.astype(np.float32)
+        self._stds_inv = (1.0 / stds).astype(np.float32)
+        self._available_steps = self.dataset.step.values
+        self.valid_t0_times = self._find_valid_t0_times(cache_dir)
         logging.debug(f"Valid initialization times:\n{self.valid_t0_times}")
 
         if "start_dt" in self.valid_t0_times.columns:
             self.valid_t0_times = self.valid_t0_times.rename(columns={"start_dt": "t0"})
 
-        if start_time:
-            self.valid_t0_times = self.valid_t0_times[
-                self.valid_t0_times["t0"] >= pd.Timestamp(start_time)
-            ]
-        if end_time:
-            self.valid_t0_times = self.valid_t0_times[
-                self.valid_t0_times["t0"] <= pd.Timestamp(end_time)
-            ]
+        if start_time or end_time:
+            # Once sorted by t0, the time window is a contiguous slice found by binary search
+            self.valid_t0_times = self.valid_t0_times.sort_values("t0", ignore_index=True)
+            t0_values = self.valid_t0_times["t0"].values
+            lo, hi = 0, len(t0_values)
+            if start_time:
+                lo = np.searchsorted(t0_values, np.datetime64(pd.Timestamp(start_time)), "left")
+            if end_time:
+                hi = np.searchsorted(t0_values, np.datetime64(pd.Timestamp(end_time)), "right")
+            self.valid_t0_times = self.valid_t0_times.iloc[lo:hi]
 
         logging.debug(f"Filtered valid_t0_times:\n{self.valid_t0_times}")
 
+    def _find_valid_t0_times(self, cache_dir: str = None) -> pd.DataFrame:
+        """
+        Find the valid initialization times, reusing a cached result when available.
+
+        The result of find_valid_time_periods only depends on the dataset's time coordinates,
+        the config and the ocf-data-sampler version, so it is cached as Parquet under a hash of
+        those inputs.
+
+        Args:
+            cache_dir (str, optional): Directory for the cache. None disables caching.
+
+        Returns:
+            pd.DataFrame: The valid time periods.
+        """
+        if cache_dir is None:
+            return find_valid_time_periods({"nwp": {"gfs": self.dataset}}, self.config)
+
+        key = hashlib.blake2b(digest_size=16)
+        key.update(self.dataset.init_time_utc.values.tobytes())
+        key.update(self.dataset.step.values.tobytes())
+        key.update(self.config.model_dump_json().encode())
+        key.update(importlib.metadata.version("ocf-data-sampler").encode())
+        cache_path = os.path.join(cache_dir, f"valid_t0_{key.hexdigest()}.parquet")
+
+        if os.path.exists(cache_path):
+            logging.info(f"Loading valid initialization times from {cache_path}")
+            return pd.read_parquet(cache_path)
+
+        valid_t0_times = find_valid_time_periods({"nwp": {"gfs": self.dataset}}, self.config)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            # Write then rename so concurrent runs never read a partially written file
+            tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+            valid_t0_times.to_parquet(tmp_path)
+            os.replace(tmp_path, cache_path)
+        except OSError as e:
+            logging.warning(f"Could not cache valid initialization times: {e}")
+        return valid_t0_times
+
+    def _select_channels(self) -> list:
+        """
+        Determine the channels to sample, once, so the hot path never re-selects them.
+
+        Channels are taken from the config, in config order, and restricted to those present in
+        both the dataset and the normalization statistics.
+
+        Returns:
+            list: The channels to sample.
+        """
+        provider = self.config.input_data.nwp.gfs.provider
+        config_channels = list(self.config.input_data.nwp.gfs.channels)
+        dataset_channels = set(self.dataset.channel.values)
+        stats_channels = set(NWP_MEANS[provider].channel.values) & set(
+            NWP_STDS[provider].channel.values
+        )
+
+        missing_in_dataset = [c for c in config_channels if c not in dataset_channels]
+        missing_in_stats = [c for c in config_channels if c not in stats_channels]
+
+        if missing_in_dataset:
+            logging.warning(f"Channels missing in dataset: {missing_in_dataset}")
+        if missing_in_stats:
+            logging.warning(f"Channels missing in normalization stats: {missing_in_stats}")
+
+        channels = [c for c in config_channels if c in dataset_channels and c in stats_channels]
+        if not channels:
+            raise ValueError("None of the configured channels are available for sampling.")
+
+        logging.debug(f"Selected Channels: {channels}")
+        return channels
+
     def __len__(self):
         return len(self.valid_t0_times)
 
@@ -123,17 +323,42 @@ class GFSDataSampler(Dataset):
         t0 = self.valid_t0_times.iloc[idx]["t0"]
         return self._get_sample(t0)
 
-    def _get_sample(self, t0: pd.Timestamp) -> xr.Dataset:
+    def __getitems__(self, indices: list) -> list:
         """
-        Retrieve a sample for a specific initialization time.
+        Retrieve several samples with a single selection on the dataset.
+
+        Used by the DataLoader when batching, so the chunks for the whole batch are read in one
+        request rather than one selection per sample.
+
+        Args:
+            indices (list): Indices of the samples to retrieve.
+
+        Returns:
+            list: The sampled data, in the order of ``indices``.
+        """
+        t0s = [self.valid_t0_times.iloc[idx]["t0"] for idx in indices]
+        steps_by_t0 = [self._get_valid_steps(t0) for t0 in t0s]
+
+        batch_data = self.dataset.sel(
+            init_time_utc=np.unique([t0.to_datetime64() for t0 in t0s]),
+            step=np.unique(np.concatenate(steps_by_t0)),
+        ).load()
+
+        return [
+            self._normalize_sample(batch_data.sel(init_time_utc=t0, step=steps))
+            for t0, steps in zip(t0s, steps_by_t0)
+        ]
+
+    def _get_valid_steps(self, t0: pd.Timestamp) -> np.ndarray:
+        """
+        Get the forecast steps covering the configured interval around an initialization time.
 
         Args:
             t0 (pd.Timestamp): The initialization time.
 
         Returns:
-            xr.Dataset: The sampled data.
+            np.ndarray: The steps available in the dataset, as timedelta64[ns].
         """
-        logging.info(f"Generating sample for t0={t0}...")
         interval_start = pd.Timedelta(minutes=self.config.input_data.nwp.gfs.interval_start_minutes)
         interval_end = pd.Timedelta(minutes=self.config.input_data.nwp.gfs.interval_end_minutes)
         time_resolution = pd.Timedelta(
@@ -145,13 +370,26 @@ class GFSDataSampler(Dataset):
         target_times = pd.date_range(start=start_dt, end=end_dt, freq=time_resolution)
         logging.debug(f"Target times: {target_times}")
 
-        valid_steps = [np.timedelta64((time - t0).value, "ns") for time in target_times]
-        available_steps = self.dataset.step.values
-        valid_steps = [step for step in valid_steps if step in available_steps]
+        valid_steps = (target_times - t0).values.astype("timedelta64[ns]")
+        valid_steps = valid_steps[np.isin(valid_steps, self._available_steps)]
 
-        if not valid_steps:
+        if valid_steps.size == 0:
             raise ValueError(f"No valid steps found for t0={t0}")
 
+        return valid_steps
+
+    def _get_sample(self, t0: pd.Timestamp) -> xr.Dataset:
+        """
+        Retrieve a sample for a specific initialization time.
+
+        Args:
+            t0 (pd.Timestamp): The initialization time.
+
+        Returns:
+            xr.Dataset: The sampled data.
+        """
+        logging.info(f"Generating sample for t0={t0}...")
+        valid_steps = self._get_valid_steps(t0)
         sliced_data = self.dataset.sel(init_time_utc=t0, step=valid_steps)
         return self._normalize_sample(sliced_data)
 
@@ -163,36 +401,24 @@ class GFSDataSampler(Dataset):
             dataset (xr.Dataset): The dataset to normalize.
 
         Returns:
-            xr.Dataset: The normalized dataset.
+            xr.Dataset: The normalized dataset, or a torch.Tensor if ``return_tensors`` is set.
         """
         logging.info("Starting normalization...")
-        provider = self.config.input_data.nwp.gfs.provider
-        dataset_channels = dataset.channel.values
-        mean_channels = NWP_MEANS[provider].channel.values
-        std_channels = NWP_STDS[provider].channel.values
-
-        valid_channels = set(dataset_channels) & set(mean_channels) & set(std_channels)
-        missing_in_dataset = set(mean_channels) - set(dataset_channels)
-        missing_in_means = set(dataset_channels) - set(mean_channels)
-
-        if missing_in_dataset:
-            logging.warning(f"Channels missing in dataset: {missing_in_dataset}")
-        if missing_in_means:
-            logging.warning(f"Channels missing in normalization stats: {missing_in_means}")
-
-        valid_channels = list(valid_channels)
-        dataset = dataset.sel(channel=valid_channels)
-        means = NWP_MEANS[provider].sel(channel=valid_channels)
-        stds = NWP_STDS[provider].sel(channel=valid_channels)
-
-        logging.debug(f"Selected Channels: {valid_channels}")
-        logging.debug(f"Mean Values: {means.values}")
-        logging.debug(f"Std Values: {stds.values}")
+        # Broadcast the per-channel constants along the channel axis of this sample
+        shape = [1] * dataset.ndim
+        shape[dataset.get_axis_num("channel")] = -1
 
         try:
-            normalized_dataset = (dataset - means) / stds
+            values = dataset.values
+            if self.nan_fill_value is not None:
+                # Only NaNs are replaced; unlike np.nan_to_num this leaves +/-inf untouched
+                values = np.where(np.isnan(values), self.nan_fill_value, values)
+            values = (values - self._means.reshape(shape)) * self._stds_inv.reshape(shape)
+            values = values.astype(self.sample_dtype, copy=False)
             logging.info("Normalization completed.")
-            return normalized_dataset
+            if self.return_tensors:
+                return torch.from_numpy(np.ascontiguousarray(values))
+            return dataset.copy(data=values)
         except Exception as e:
             logging.error(f"Error during normalization: {e}")
             raise e
@@ -203,7 +429,6 @@ class GFSDataSampler(Dataset):
 #     dataset_path = "s3://ocf-open-data-pvnet/data/gfs.zarr"
 #     config_path = "src/open_data_pvnet/configs/gfs_data_config.yaml"
 #     dataset = open_gfs(dataset_path)
-#     dataset = handle_nan_values(dataset, method="fill", fill_value=0.0)
-#     sampler = GFSDataSampler(dataset, config_filename=config_path, start_time="2023-01-01T00:00:00", end_time="2023-01-30T00:00:00")
+#     sampler = GFSDataSampler(dataset, config_filename=config_path, start_time="2023-01-01T00:00:00", end_time="2023-01-30T00:00:00", nan_fill_value=0.0, cache_dir=DEFAULT_CACHE_DIR)
 #     sample = sampler[0]
 #     print(sample)
@@ -14,80 +14,318 @@ Requirements:
     - typer
 
 The script will:
-1. Fetch data for each GSP ID from PVLive API
-2. Add gsp_id column to each dataset
-3. Combine all datasets into a single DataFrame
-4. Convert to xarray Dataset and save as Zarr format
-5. Output file: combined_gsp_{start_date}_{end_date}.zarr
+1. Fetch data for each GSP ID from PVLive API (concurrently, see --max-workers)
+2. Combine all datasets into a single DataFrame with a gsp_id column
+3. Convert to xarray Dataset and save as Zarr format
+4. Output file: combined_gsp_{start_date}_{end_date}.zarr
 
 Note: Some GSP IDs may not exist and will be skipped with a warning message.
 """
 
+import numpy as np
 import pandas as pd
 import xarray as xr
-from datetime import datetime
-import pytz
+import zarr
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+from typing import Dict, Optional
 import os
 import typer
 import logging
 
 from src.open_data_pvnet.scripts.fetch_pvlive_data import PVLiveData
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+# Chunking of the output Zarr. Training reads slices across many GSPs for a window of time, so
+# each chunk holds 64 GSPs and 4096 half-hourly timestamps (~85 days): 64 x 4096 float32 values
+# is 1 MB per variable before compression, and a whole snapshot needs only 5 chunks per variable.
+OUTPUT_CHUNKS = {"gsp_id": 64, "datetime_gmt": 4096}
+
+# Bit-shuffled zstd compresses smooth float time series much better than the default LZ4
+OUTPUT_COMPRESSOR = zarr.Blosc(cname="zstd", clevel=3, shuffle=zarr.Blosc.BITSHUFFLE)
+
+
+def get_zarr_encoding(xr_pv: xr.Dataset, quantize: bool = False) -> dict:
+    """
+    Build the Zarr encoding for the combined GSP dataset.
+
+    Data variables use OUTPUT_COMPRESSOR. The time coordinate is stored as a single chunk of
+    int64 minutes with a delta filter, since consecutive timestamps differ by a near-constant
+    step and delta-encode to almost nothing.
+
+    If quantize is set, each data variable is stored as uint16 with a scale_factor and
+    add_offset spanning its range, with 65535 reserved for NaN. This halves the store again
+    at a resolution of (max - min) / 65534 per variable; xarray rescales on read.
+
+    Args:
+        xr_pv (xr.Dataset): The combined GSP dataset to be written.
+        quantize (bool): Whether to store data variables as scaled uint16.
+
+    Returns:
+        dict: Encoding to pass to ``to_zarr``.
+    """
+    encoding = {
+        var: {"compressor": OUTPUT_COMPRESSOR, "dtype": xr_pv[var].dtype} for var in xr_pv.data_vars
+    }
+
+    if quantize:
+        for var in xr_pv.data_vars:
+            vmin, vmax = float(xr_pv[var].min()), float(xr_pv[var].max())
+            if np.isnan(vmin):
+                continue
+            scale = max(vmax - vmin, np.finfo(np.float32).eps) / 65534
+            logging.info(f"Quantizing {var} to uint16 with a resolution of {scale:.6g}")
+            encoding[var].update(
+                {"dtype": "uint16", "scale_factor": scale, "add_offset": vmin, "_FillValue": 65535}
+            )
+
+    encoding["datetime_gmt"] = {
+        "chunks": (xr_pv.sizes["datetime_gmt"],),
+        "dtype": "int64",
+        "units": "minutes since 1970-01-01",
+        "filters": [zarr.Delta(dtype="int64")],
+        "compressor": OUTPUT_COMPRESSOR,
+    }
+    return encoding
+
+
+def fetch_gsp_data(
+    data_source: PVLiveData,
+    gsp_id: int,
+    range_start: datetime,
+    range_end: datetime,
+    cache_folder: Optional[str] = None,
+) -> Optional[pd.DataFrame]:
+    """
+    Fetch PVLive data for a single GSP.
+
+    If cache_folder is given, the result is stored there as Parquet and reused on later runs
+    with the same GSP and date range, so an interrupted or extended run only fetches what is
+    missing.
+
+    Args:
+        data_source (PVLiveData): Client used to query PVLive.
+        gsp_id (int): The GSP to fetch.
+        range_start (datetime): Start of the period to fetch.
+        range_end (datetime): End of the period to fetch.
+        cache_folder (str, optional): Folder for the per-GSP Parquet cache.
+
+    Returns:
+        Optional[pd.DataFrame]: The PVLive data, or None if no data is available for the GSP.
+    """
+    cache_path = None
+    if cache_folder is not None:
+        cache_path = os.path.join(
+            cache_folder, f"gsp_{gsp_id:03d}_{range_start.date()}_{range_end.date()}.parquet"
+        )
+        if os.path.exists(cache_path):
+            logging.info(f"Loading GSP ID {gsp_id} from cache")
+            return pd.read_parquet(cache_path)
+
+    logging.info(f"Processing GSP ID {gsp_id}")
+    df = data_source.get_data_between(
+        start=range_start,
+        end=range_end,
+        entity_id=gsp_id,
+        extra_fields="capacity_mwp,installedcapacity_mwp",
+    )
+
+    if df is None or df.empty:
+        logging.warning(f"No data available for GSP ID {gsp_id}")
+        return None
+
+    if cache_path is not None:
+        # Write then rename so an interrupted run never leaves a partial cache file
+        tmp_path = f"{cache_path}.tmp"
+        df.to_parquet(tmp_path, compression="zstd")
+        os.replace(tmp_path, cache_path)
+
+    return df
+
+
+def to_naive_utc(datetimes: pd.Series) -> np.ndarray:
+    """
+    Convert a column of datetimes to naive UTC datetime64 values.
+
+    PVLive already returns tz-aware UTC datetimes, for which only the timezone is dropped
+    without re-parsing. Strings are parsed with pandas' ISO-8601 fast path.
+
+    Args:
+        datetimes (pd.Series): Tz-aware, naive or ISO-8601 string datetimes.
+
+    Returns:
+        np.ndarray: Naive UTC datetime64 values.
+    """
+    if isinstance(datetimes.dtype, pd.DatetimeTZDtype):
+        return datetimes.dt.tz_convert(None).to_numpy()
+    if pd.api.types.is_datetime64_dtype(datetimes.dtype):
+        return datetimes.to_numpy()
+    return pd.to_datetime(datetimes, utc=True, format="ISO8601").dt.tz_convert(None).to_numpy()
+
+
+def combine_gsp_dataframes(dataframes_by_gsp: Dict[int, pd.DataFrame]) -> pd.DataFrame:
+    """
+    Combine the per-GSP dataframes into a single dataframe in one pass.
+
+    Each column is built with a single np.concatenate and the gsp_id column with np.repeat,
+    rather than concatenating dataframes and converting the datetimes afterwards. Rows are
+    ordered by gsp_id, then by the order returned from PVLive.
+
+    Args:
+        dataframes_by_gsp (Dict[int, pd.DataFrame]): PVLive data keyed by gsp_id.
+
+    Returns:
+        pd.DataFrame: Combined data with gsp_id, naive UTC datetime_gmt and the value columns.
+    """
+    gsp_ids = sorted(dataframes_by_gsp)
+    frames = [
+        dataframes_by_gsp[gsp_id].rename(columns={"datetime": "datetime_gmt"}) for gsp_id in gsp_ids
+    ]
+    lengths = [len(df) for df in frames]
+    value_columns = list(
+        dict.fromkeys(c for df in frames for c in df.columns if c not in ("gsp_id", "datetime_gmt"))
+    )
+
+    # Datetimes are converted per GSP so tz-aware columns stay on pandas' vectorized path
+    datetimes = [to_naive_utc(df["datetime_gmt"]) for df in frames]
+
+    data = {
+        # GSP IDs run 0-318, so int16 is enough
+        "gsp_id": np.repeat(np.asarray(gsp_ids, dtype=np.int16), lengths),
+        "datetime_gmt": np.concatenate(datetimes),
+    }
+    for col in value_columns:
+        data[col] = np.concatenate(
+            [df[col].to_numpy() if col in df else np.full(len(df), np.nan) for df in frames]
+        )
+
+    return pd.DataFrame(data)
+
+
+def dataframe_to_dataset(
+    df_pv: pd.DataFrame, time_index: Optional[pd.DatetimeIndex] = None
+) -> xr.Dataset:
+    """
+    Convert the combined dataframe to a dense (gsp_id, datetime_gmt) xarray Dataset.
+
+    Each value column is scattered straight into a preallocated 2D array, avoiding the
+    MultiIndex unstack done by xr.Dataset.from_dataframe. Missing (gsp_id, datetime_gmt)
+    pairs are filled with NaN. Numeric columns are stored as float32, which is well within
+    the precision of the PVLive values and halves the size of the output.
+
+    Args:
+        df_pv (pd.DataFrame): Combined data with gsp_id and datetime_gmt columns.
+        time_index (pd.DatetimeIndex, optional): Regular time grid to place the data on. Rows
+            whose timestamps are not on the grid are dropped. Defaults to the sorted unique
+            timestamps in the data.
+
+    Returns:
+        xr.Dataset: Dataset with one variable per value column.
+    """
+    gsp_values = df_pv["gsp_id"].to_numpy()
+    time_values = df_pv["datetime_gmt"].to_numpy()
+    gsp_ids = np.unique(gsp_values)
+    times = np.unique(time_values) if time_index is None else time_index.to_numpy()
+
+    gsp_idx = np.searchsorted(gsp_ids, gsp_values)
+    time_idx = np.searchsorted(times, time_values)
+
+    # Keep only rows that land exactly on a grid timestamp
+    on_grid = time_idx < len(times)
+    on_grid[on_grid] = times[time_idx[on_grid]] == time_values[on_grid]
+    rows = slice(None)
+    if not on_grid.all():
+        logging.warning(f"Dropping {(~on_grid).sum()} rows outside the time grid")
+        rows = on_grid
+        gsp_idx, time_idx = gsp_idx[rows], time_idx[rows]
+
+    data_vars = {}
+    for col in df_pv.columns.drop(["gsp_id", "datetime_gmt"]):
+        values = df_pv[col].to_numpy()[rows]
+        # Missing pairs are NaN, so integer and boolean columns are promoted to float as well
+        if values.dtype.kind in "iubf":
+            values = values.astype(np.float32)
+        elif values.dtype.kind != "c":
+            values = values.astype(object)
+        arr = np.full((len(gsp_ids), len(times)), np.nan, dtype=values.dtype)
+        arr[gsp_idx, time_idx] = values
+        data_vars[col] = (("gsp_id", "datetime_gmt"), arr)
+
+    return xr.Dataset(data_vars, coords={"gsp_id": gsp_ids, "datetime_gmt": times})
+
 
 def main(
     start_year: int = typer.Option(2020, help="Start year for data collection"),
     end_year: int = typer.Option(2025, help="End year for data collection"),
-    output_folder: str = typer.Option("data", help="Output folder for the zarr dataset")
+    output_folder: str = typer.Option("data", help="Output folder for the zarr dataset"),
+    max_workers: int = typer.Option(32, help="Number of concurrent PVLive requests"),
+    cache_folder: Optional[str] = typer.Option(
+        None, help="Folder for caching per-GSP PVLive responses between runs"
+    ),
+    quantize: bool = typer.Option(
+        False, help="Store values as scaled uint16 (lossy) to halve the output size"
+    ),
 ):
     """
     Generate combined GSP data for all GSPs and save as a zarr dataset.
     """
-    range_start = datetime(start_year, 1, 1, tzinfo=pytz.UTC)
-    range_end = datetime(end_year, 1, 1, tzinfo=pytz.UTC)
+    range_start = datetime(start_year, 1, 1, tzinfo=timezone.utc)
+    range_end = datetime(end_year, 1, 1, tzinfo=timezone.utc)
 
     data_source = PVLiveData()
 
-    all_dataframes = []
+    if cache_folder is not None:
+        os.makedirs(cache_folder, exist_ok=True)
 
-    # Changed range to start from 0 to include gsp_id=0
-    for gsp_id in range(0, 319):  
-        logging.info(f"Processing GSP ID {gsp_id}")
-        df = data_source.get_data_between(
-            start=range_start,
-            end=range_end,
-            entity_id=gsp_id,
-            extra_fields="capacity_mwp,installedcapacity_mwp"
-        )
-        
-        if df is not None and not df.empty:
-            # Add gsp_id column to the dataframe
-            df["gsp_id"] = gsp_id
-            all_dataframes.append(df)
-        else:
-            logging.warning(f"No data available for GSP ID {gsp_id}")
-
-    # Concatenate all dataframes
-    if all_dataframes:
-        df_pv = pd.concat(all_dataframes, ignore_index=True)
+    # Each request is a blocking HTTP round-trip, so fetch the GSPs concurrently.
+    # Range starts from 0 to include gsp_id=0
+    dataframes_by_gsp = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(
+                fetch_gsp_data, data_source, gsp_id, range_start, range_end, cache_folder
+            ): gsp_id
+            for gsp_id in range(0, 319)
+        }
+        for future in as_completed(futures):
+            df = future.result()
+            if df is not None:
+                dataframes_by_gsp[futures[future]] = df
+
+    # Combine all dataframes, ordered by gsp_id regardless of completion order
+    if dataframes_by_gsp:
+        df_pv = combine_gsp_dataframes(dataframes_by_gsp)
     else:
         logging.error("No data retrieved for any GSP IDs - terminating")
         return
 
-    df_pv.rename(columns={"datetime": "datetime_gmt"}, inplace=True)
-    df_pv["datetime_gmt"] = pd.to_datetime(df_pv["datetime_gmt"], utc=True).dt.tz_convert(None)
-    df_pv = df_pv.set_index(["gsp_id", "datetime_gmt"])
-
-    xr_pv = xr.Dataset.from_dataframe(df_pv)
-    xr_pv = xr_pv.chunk({"gsp_id": 1, "datetime_gmt": 1000})
+    # PVLive GSP data is half-hourly, so place it on the full half-hourly grid for the range
+    time_index = pd.date_range(
+        range_start.replace(tzinfo=None), range_end.replace(tzinfo=None), freq="30min"
+    )
+    xr_pv = dataframe_to_dataset(df_pv, time_index=time_index)
+    xr_pv = xr_pv.chunk(OUTPUT_CHUNKS)
+    xr_pv.attrs["chunking"] = (
+        f"gsp_id={OUTPUT_CHUNKS['gsp_id']}, datetime_gmt={OUTPUT_CHUNKS['datetime_gmt']}: "
+        "~1 MB float32 chunks, oriented for reads across GSPs over a time window"
+    )
 
     os.makedirs(output_folder, exist_ok=True)
     filename = f"combined_gsp_{range_start.date()}_{range_end.date()}.zarr"
     output_path = os.path.join(output_folder, filename)
-    xr_pv.to_zarr(output_path, mode="w", consolidated=True)
+    xr_pv.to_zarr(
+        output_path,
+        mode="w",
+        consolidated=True,
+        encoding=get_zarr_encoding(xr_pv, quantize=quantize),
+        write_empty_chunks=False,
+    )
 
     logging.info(f"Successfully saved combined GSP dataset to {output_path}")
-    logging.info(f"Dataset contains GSPs 0-318 for period {range_start.date()} to {range_end.date()}")
+    logging.info(
+        f"Dataset contains GSPs 0-318 for period {range_start.date()} to {range_end.date()}"
+    )
 
 
 if __name__ == "__main__":
@@ -26,7 +26,9 @@ if __name__ == "__main__":
     import torch.multiprocessing as mp
 
     # Set the start method for torch multiprocessing. Choose either "forkserver" or "spawn" to be
-    # compatible with dask's multiprocessing.
+    # compatible with dask's multiprocessing. "fork" is deliberately avoided: the dask thread pool
+    # configured below is already running by the time the DataLoader starts its workers, and
+    # forking a process with live threads can deadlock the children.
     mp.set_start_method("forkserver")
 
     # Set the sharing strategy to 'file_system' to handle file descriptor limitations. This is
@@ -40,6 +42,8 @@ import os
 import shutil
 import sys
 import warnings
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 import dask
 import hydra
@@ -112,17 +116,31 @@ def save_samples_with_dataloader(
     num_samples: int,
     dataloader_kwargs: dict,
     renewable: str = "pv_uk",
+    num_save_workers: int = 4,
 ) -> None:
-    """Save samples from a dataset using a dataloader."""
+    """Save samples from a dataset using a dataloader.
+
+    Saves run on a small thread pool so writing to disk overlaps with the dataloader producing
+    the next samples. At most 2 * num_save_workers saves are queued at once, so samples do not
+    pile up in memory if the disk is slower than the dataloader.
+    """
     save_func = SaveFuncFactory(save_dir, renewable=renewable)
 
     dataloader = DataLoader(dataset, **dataloader_kwargs)
 
-    pbar = tqdm(total=num_samples)
-    for i, sample in zip(range(num_samples), dataloader):
-        save_func(sample, i)
-        pbar.update()
-    pbar.close()
+    # Refresh at most once a second so the bar does not cost much when samples are small
+    pending = deque()
+    with tqdm(total=num_samples, mininterval=1.0) as pbar:
+        with ThreadPoolExecutor(max_workers=num_save_workers) as executor:
+            for i, sample in zip(range(num_samples), dataloader):
+                pending.append(executor.submit(save_func, sample, i))
+                if len(pending) >= 2 * num_save_workers:
+                    pending.popleft().result()
+                    pbar.update()
+
+            while pending:
+                pending.popleft().result()
+                pbar.update()
 
 
 @hydra.main(config_path="../configs/PVNet_configs", config_name="config.yaml", version_base="1.2")
@@ -159,6 +177,9 @@ def main(config: DictConfig) -> None:
         persistent_workers=False,  # Not needed since we only enter the dataloader loop once
     )
 
+    # Number of threads writing samples to disk while the dataloader prepares the next ones
+    num_save_workers = config_dm.get("num_save_workers", 4)
+
     if config_dm.num_val_samples > 0:
         print("----- Saving val samples -----")
 
@@ -181,6 +202,7 @@ def main(config: DictConfig) -> None:
             num_samples=config_dm.num_val_samples,
             dataloader_kwargs=dataloader_kwargs,
             renewable=config.renewable,
+            num_save_workers=num_save_workers,
         )
 
         del val_dataset
@@ -207,6 +229,7 @@ def main(config: DictConfig) -> None:
             num_samples=config_dm.num_train_samples,
             dataloader_kwargs=dataloader_kwargs,
             renewable=config.renewable,
+            num_save_workers=num_save_workers,
         )
 
         del train_dataset
@@ -0,0 +1,151 @@
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+
+import numpy as np
+import pandas as pd
+import pytest
+import xarray as xr
+import zarr
+
+from open_data_pvnet.scripts.generate_combined_gsp import (
+    combine_gsp_dataframes,
+    dataframe_to_dataset,
+    fetch_gsp_data,
+    get_zarr_encoding,
+    to_naive_utc,
+)
+
+
+def _make_gsp_df(n_times: int, offset: float) -> pd.DataFrame:
+    """Create a dataframe shaped like a PVLive response for a single GSP."""
+    return pd.DataFrame(
+        {
+            "gsp_id": 0,
+            "datetime_gmt": pd.date_range("2023-01-01", periods=n_times, freq="30min", tz="UTC"),
+            "generation_mw": np.arange(n_times, dtype=float) + offset,
+            "capacity_mwp": 10.0,
+        }
+    )
+
+
+@pytest.fixture
+def dataframes_by_gsp():
+    """PVLive responses for two GSPs with different lengths, keyed out of order."""
+    return {5: _make_gsp_df(3, 100.0), 2: _make_gsp_df(4, 0.0)}
+
+
+def test_combine_gsp_dataframes(dataframes_by_gsp):
+    """Test that frames are combined in gsp_id order with naive UTC datetimes."""
+    df_pv = combine_gsp_dataframes(dataframes_by_gsp)
+
+    assert list(df_pv.columns) == ["gsp_id", "datetime_gmt", "generation_mw", "capacity_mwp"]
+    assert df_pv["gsp_id"].tolist() == [2, 2, 2, 2, 5, 5, 5]
+    assert df_pv["gsp_id"].dtype == np.int16
+    assert df_pv["datetime_gmt"].dt.tz is None
+    assert df_pv["generation_mw"].tolist() == [0.0, 1.0, 2.0, 3.0, 100.0, 101.0, 102.0]
+
+
+def test_combine_gsp_dataframes_renames_datetime():
+    """Test that a 'datetime' column is treated as datetime_gmt."""
+    df = _make_gsp_df(2, 0.0).rename(columns={"datetime_gmt": "datetime"})
+    df_pv = combine_gsp_dataframes({1: df})
+
+    assert "datetime" not in df_pv.columns
+    assert df_pv["datetime_gmt"].tolist() == [
+        pd.Timestamp("2023-01-01 00:00"),
+        pd.Timestamp("2023-01-01 00:30"),
+    ]
+
+
+@pytest.mark.parametrize(
+    "datetimes",
+    [
+        pd.Series(pd.to_datetime(["2023-01-01 00:00", "2023-01-01 00:30"]).tz_localize("UTC")),
+        pd.Series(pd.to_datetime(["2023-01-01 00:00", "2023-01-01 00:30"])),
+        pd.Series(["2023-01-01T00:00:00Z", "2023-01-01T00:30:00+00:00"]),
+    ],
+)
+def test_to_naive_utc(datetimes):
+    """Test that tz-aware, naive and ISO-8601 string datetimes give naive UTC values."""
+    expected = np.array(["2023-01-01T00:00", "2023-01-01T00:30"], dtype="datetime64[ns]")
+    np.testing.assert_array_equal(to_naive_utc(datetimes), expected)
+
+
+def test_dataframe_to_dataset_matches_from_dataframe(dataframes_by_gsp):
+    """Test that the dense conversion matches xarray's from_dataframe, including NaN gaps."""
+    df_pv = combine_gsp_dataframes(dataframes_by_gsp)
+
+    ds = dataframe_to_dataset(df_pv)
+    expected = xr.Dataset.from_dataframe(df_pv.set_index(["gsp_id", "datetime_gmt"]))
+
+    xr.testing.assert_equal(ds, expected.astype(np.float32))
+    assert all(ds[var].dtype == np.float32 for var in ds.data_vars)
+    assert np.isnan(ds["generation_mw"].sel(gsp_id=5).values[-1])
+
+
+def test_dataframe_to_dataset_with_time_index(dataframes_by_gsp):
+    """Test that data is placed on a given time grid and off-grid rows are dropped."""
+    df_pv = combine_gsp_dataframes(dataframes_by_gsp)
+    df_pv.loc[0, "datetime_gmt"] = pd.Timestamp("2023-01-01 00:10")
+    time_index = pd.date_range("2023-01-01", "2023-01-01 03:00", freq="30min")
+
+    ds = dataframe_to_dataset(df_pv, time_index=time_index)
+
+    assert ds.sizes["datetime_gmt"] == len(time_index)
+    generation = ds["generation_mw"].sel(gsp_id=2).values
+    np.testing.assert_array_equal(generation[:4], [np.nan, 1.0, 2.0, 3.0])
+    assert np.isnan(generation[4:]).all()
+
+
+def test_zarr_encoding_round_trip(dataframes_by_gsp, tmp_path):
+    """Test that the output encoding compresses the data and round-trips the dataset."""
+    ds = dataframe_to_dataset(combine_gsp_dataframes(dataframes_by_gsp))
+    output_path = tmp_path / "combined_gsp.zarr"
+
+    ds.to_zarr(output_path, mode="w", consolidated=True, encoding=get_zarr_encoding(ds))
+
+    store = zarr.open(str(output_path), mode="r")
+    assert store["generation_mw"].compressor.cname == "zstd"
+    assert store["datetime_gmt"].chunks == (ds.sizes["datetime_gmt"],)
+    xr.testing.assert_identical(xr.open_zarr(output_path).load(), ds)
+
+
+def test_fetch_gsp_data_uses_cache(tmp_path):
+    """Test that a cached GSP response is reused instead of fetched again."""
+    data_source = MagicMock()
+    data_source.get_data_between.return_value = _make_gsp_df(3, 0.0)
+    range_start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+    range_end = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    first = fetch_gsp_data(data_source, 7, range_start, range_end, cache_folder=str(tmp_path))
+    second = fetch_gsp_data(data_source, 7, range_start, range_end, cache_folder=str(tmp_path))
+
+    data_source.get_data_between.assert_called_once()
+    assert (tmp_path / "gsp_007_2023-01-01_2024-01-01.parquet").exists()
+    pd.testing.assert_frame_equal(first, second)
+
+
+def test_fetch_gsp_data_does_not_cache_missing(tmp_path):
+    """Test that GSPs without data return None and are not cached."""
+    data_source = MagicMock()
+    data_source.get_data_between.return_value = None
+    range_start = datetime(2023, 1, 1, tzinfo=timezone.utc)
+    range_end = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    assert fetch_gsp_data(data_source, 7, range_start, range_end, str(tmp_path)) is None
+    assert not list(tmp_path.iterdir())
+
+
+def test_zarr_encoding_quantized_round_trip(dataframes_by_gsp, tmp_path):
+    """Test that quantized values are stored as uint16 and decode within one step."""
+    ds = dataframe_to_dataset(combine_gsp_dataframes(dataframes_by_gsp))
+    output_path = tmp_path / "combined_gsp.zarr"
+
+    ds.to_zarr(output_path, mode="w", encoding=get_zarr_encoding(ds, quantize=True))
+
+    store = zarr.open(str(output_path), mode="r")
+    assert store["generation_mw"].dtype == np.uint16
+    decoded = xr.open_zarr(output_path).load()
+    resolution = (102.0 - 0.0) / 65534
+    np.testing.assert_allclose(decoded["generation_mw"], ds["generation_mw"], atol=resolution)
+    assert np.isnan(decoded["generation_mw"].sel(gsp_id=5).values[-1])
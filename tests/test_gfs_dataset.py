@@ -0,0 +1,227 @@
+import numpy as np
+import pandas as pd
+import pytest
+import torch
+import xarray as xr
+import zarr
+from ocf_data_sampler.constants import NWP_MEANS, NWP_STDS
+
+from open_data_pvnet.nwp import gfs_dataset
+from open_data_pvnet.nwp.gfs_dataset import GFSDataSampler, handle_nan_values, rechunk_coords
+
+# Config order deliberately differs from the dataset's channel order
+CONFIG_CHANNELS = ["t", "dswrf", "u10"]
+DATASET_CHANNELS = ["dswrf", "hcc", "t", "u10"]
+
+GFS_CONFIG = """
+general:
+  name: "gfs_config"
+  description: "Configuration for GFS data sampling"
+
+input_data:
+  nwp:
+    gfs:
+      time_resolution_minutes: 180
+      interval_start_minutes: 0
+      interval_end_minutes: 540
+      dropout_timedeltas_minutes: []
+      accum_channels: []
+      max_staleness_minutes: 540
+      zarr_path: "gfs.zarr"
+      provider: "gfs"
+      image_size_pixels_height: 1
+      image_size_pixels_width: 1
+      channels: {channels}
+"""
+
+
+@pytest.fixture
+def gfs_config_path(tmp_path):
+    """Write a small GFS sampler config to a temporary file."""
+    path = tmp_path / "gfs_data_config.yaml"
+    path.write_text(GFS_CONFIG.format(channels=CONFIG_CHANNELS))
+    return str(path)
+
+
+@pytest.fixture
+def gfs_data():
+    """Create a small in-memory GFS DataArray with the dims produced by open_gfs."""
+    # Gaps of more than max_staleness_minutes between days give one valid period per day
+    init_times = pd.DatetimeIndex(
+        [f"2023-01-0{day}T{hour:02d}:00" for day in range(1, 5) for hour in (0, 6)]
+    )
+    steps = pd.timedelta_range(start="0h", end="18h", freq="3h")
+    latitudes = np.array([51.0, 50.0])
+    longitudes = np.array([-1.0, 0.0, 1.0])
+
+    rng = np.random.default_rng(0)
+    # Scale each channel around its normalization mean so normalized values are O(1)
+    means = NWP_MEANS["gfs"].sel(channel=DATASET_CHANNELS).values
+    stds = NWP_STDS["gfs"].sel(channel=DATASET_CHANNELS).values
+    shape = (len(init_times), len(steps), len(DATASET_CHANNELS), len(latitudes), len(longitudes))
+    values = rng.standard_normal(shape) * stds[:, None, None] + means[:, None, None]
+
+    return xr.DataArray(
+        values.astype(np.float32),
+        dims=("init_time_utc", "step", "channel", "latitude", "longitude"),
+        coords={
+            "init_time_utc": init_times,
+            "step": steps,
+            "channel": DATASET_CHANNELS,
+            "latitude": latitudes,
+            "longitude": longitudes,
+        },
+    )
+
+
+def test_channels_follow_config_order(gfs_data, gfs_config_path):
+    sampler = GFSDataSampler(gfs_data, config_filename=gfs_config_path, cache_dir=None)
+
+    assert sampler.channels == CONFIG_CHANNELS
+    assert list(sampler[0].channel.values) == CONFIG_CHANNELS
+
+
+def test_getitems_matches_getitem(gfs_data, gfs_config_path):
+    sampler = GFSDataSampler(gfs_data, config_filename=gfs_config_path, cache_dir=None)
+    assert len(sampler) >= 3
+    indices = [2, 0, len(sampler) - 1]
+
+    batch = sampler.__getitems__(indices)
+
+    assert len(batch) == len(indices)
+    for sample, idx in zip(batch, indices):
+        xr.testing.assert_identical(sample, sampler[idx])
+
+
+def test_normalization_matches_stats(gfs_data, gfs_config_path):
+    sampler = GFSDataSampler(gfs_data, config_filename=gfs_config_path, cache_dir=None)
+    t0 = sampler.valid_t0_times.iloc[0]["t0"]
+
+    sample = sampler[0]
+
+    raw = gfs_data.sel(init_time_utc=t0, step=sample.step.values, channel=CONFIG_CHANNELS)
+    expected = (raw - NWP_MEANS["gfs"].sel(channel=CONFIG_CHANNELS)) / NWP_STDS["gfs"].sel(
+        channel=CONFIG_CHANNELS
+    )
+    expected = expected.transpose(*sample.dims)
+    np.testing.assert_allclose(sample.values, expected.values, rtol=1e-5, atol=1e-5)
+
+
+@pytest.mark.parametrize(
+    "sample_dtype, tensor_dtype", [(np.float32, torch.float32), (np.float16, torch.float16)]
+)
+def test_return_tensors_shape_and_dtype(gfs_data, gfs_config_path, sample_dtype, tensor_dtype):
+    sampler = GFSDataSampler(
+        gfs_data,
+        config_filename=gfs_config_path,
+        cache_dir=None,
+        return_tensors=True,
+        sample_dtype=sample_dtype,
+    )
+
+    tensors = sampler.__getitems__([0, 1])
+    # interval_end_minutes=540 at a 3 hour resolution gives steps 0, 3, 6 and 9 hours
+    expected_shape = (4, len(CONFIG_CHANNELS), gfs_data.latitude.size, gfs_data.longitude.size)
+
+    for tensor, idx in zip(tensors, [0, 1]):
+        assert isinstance(tensor, torch.Tensor)
+        assert tensor.shape == expected_shape
+        assert tensor.dtype == tensor_dtype
+        assert tensor.is_contiguous()
+        torch.testing.assert_close(tensor, sampler[idx])
+
+
+def test_sample_dtype_float16(gfs_data, gfs_config_path):
+    sampler = GFSDataSampler(
+        gfs_data, config_filename=gfs_config_path, cache_dir=None, sample_dtype=np.float16
+    )
+
+    sample = sampler[0]
+
+    assert sample.dtype == np.float16
+    assert sample.dims == ("step", "channel", "latitude", "longitude")
+
+
+def test_nan_fill_value_leaves_inf(gfs_data, gfs_config_path):
+    t0 = pd.Timestamp("2023-01-01")
+    gfs_data.loc[dict(init_time_utc=t0, step=pd.Timedelta("0h"), channel="t")] = [
+        [np.nan, np.inf, 0.0],
+        [0.0, -np.inf, 0.0],
+    ]
+    sampler = GFSDataSampler(
+        gfs_data, config_filename=gfs_config_path, cache_dir=None, nan_fill_value=0.0
+    )
+
+    sample = sampler[0]
+    expected = handle_nan_values(gfs_data, "fill", fill_value=0.0).sel(
+        init_time_utc=t0, step=sample.step.values, channel=CONFIG_CHANNELS
+    )
+    expected = (expected - NWP_MEANS["gfs"].sel(channel=CONFIG_CHANNELS)) / NWP_STDS["gfs"].sel(
+        channel=CONFIG_CHANNELS
+    )
+
+    t = sample.sel(step=pd.Timedelta("0h"), channel="t").values
+    assert not np.isnan(t).any()
+    assert t[0, 1] == np.inf
+    assert t[1, 1] == -np.inf
+    np.testing.assert_allclose(sample.values, expected.values, rtol=1e-5, atol=1e-5)
+
+
+def test_valid_t0_cache_miss_then_hit(gfs_data, gfs_config_path, tmp_path, mocker):
+    cache_dir = tmp_path / "cache"
+    find_spy = mocker.patch.object(
+        gfs_dataset, "find_valid_time_periods", wraps=gfs_dataset.find_valid_time_periods
+    )
+
+    first = GFSDataSampler(gfs_data, config_filename=gfs_config_path, cache_dir=str(cache_dir))
+    assert find_spy.call_count == 1
+    assert len(list(cache_dir.glob("valid_t0_*.parquet"))) == 1
+
+    second = GFSDataSampler(gfs_data, config_filename=gfs_config_path, cache_dir=str(cache_dir))
+    assert find_spy.call_count == 1
+    pd.testing.assert_frame_equal(first.valid_t0_times, second.valid_t0_times)
+
+
+def test_valid_t0_cache_disabled_by_default(gfs_data, gfs_config_path, mocker):
+    find_spy = mocker.patch.object(
+        gfs_dataset, "find_valid_time_periods", wraps=gfs_dataset.find_valid_time_periods
+    )
+
+    # Without a cache every construction recomputes the valid times
+    GFSDataSampler(gfs_data, config_filename=gfs_config_path)
+    GFSDataSampler(gfs_data, config_filename=gfs_config_path)
+    GFSDataSampler(gfs_data, config_filename=gfs_config_path, cache_dir=None)
+
+    assert find_spy.call_count == 3
+
+
+def test_rechunk_coords(tmp_path):
+    store_path = str(tmp_path / "gfs.zarr")
+    ds = xr.Dataset(
+        {
+            "t": (
+                ("init_time", "step", "latitude"),
+                np.arange(36, dtype=np.float32).reshape(6, 3, 2),
+            )
+        },
+        coords={
+            "init_time": pd.date_range("2023-01-01", periods=6, freq="6h"),
+            "step": pd.timedelta_range(start="0h", periods=3, freq="3h"),
+            "latitude": [51.0, 50.0],
+        },
+        attrs={"description": "test store"},
+    )
+    ds["step"].attrs["long_name"] = "forecast step"
+    ds.to_zarr(
+        store_path,
+        consolidated=True,
+        encoding={"init_time": {"chunks": (3,)}, "step": {"chunks": (1,)}},
+    )
+    assert zarr.open_group(store_path)["init_time"].chunks == (3,)
+
+    rechunk_coords(store_path)
+
+    group = zarr.open_consolidated(store_path)
+    assert group["init_time"].chunks == (6,)
+    assert group["step"].chunks == (3,)
+    xr.testing.assert_identical(xr.open_zarr(store_path, consolidated=True).load(), ds)